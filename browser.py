@@ -1,68 +1,152 @@
-"""Playwright browser launcher.
+"""Arranque del navegador Playwright.
 
-Why this exists
+Por qué existe
 --------------
-On servers/SSH sessions without an X server (no $DISPLAY), launching a *headed*
-Chromium will crash with:
+En servidores o sesiones SSH sin servidor X (sin $DISPLAY), abrir Chromium
+*con interfaz* falla con:
     Missing X server or $DISPLAY
-and Playwright raises TargetClosedError.
+y Playwright lanza TargetClosedError.
 
-This helper automatically forces headless mode when $DISPLAY is not set,
-while still allowing headed execution on desktops.
+``config.load_config`` calcula ``AppConfig.effective_headless`` una sola vez:
+fuerza headless cuando no hay $DISPLAY y permite la interfaz en escritorio.
+Este módulo se limita a respetar ese valor.
 
-It is designed to be used as:
+Uso previsto:
     with launch_browser(config) as (_, page):
         ...
 """
 
 from __future__ import annotations
 
-import os
 from contextlib import contextmanager
-from typing import Generator, Tuple, Any
+from typing import Any, Generator, Optional, Tuple
 
-from playwright.sync_api import sync_playwright, Browser, Page  # type: ignore
+from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, Route  # type: ignore
 
+from config import AppConfig
+from utils.logging_utils import get_logger
 
-def _should_run_headless(config: Any) -> bool:
-    """Determine whether Playwright must run headless."""
-    cfg_headless = bool(getattr(config, "headless", False))
-    # If there's no display, we *must* be headless regardless of config.
-    no_display = not os.environ.get("DISPLAY")
-    return cfg_headless or no_display
+# Flags extra de Chromium en headless/servidor: evitan /dev/shm (mínimo en
+# Docker), la inicialización de GPU y servicios de fondo que ePAC no usa.
+HEADLESS_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-breakpad",
+    "--disable-component-update",
+    "--no-first-run",
+    "--mute-audio",
+]
+
+# Tipos de recurso que el flujo no necesita. Las hojas de estilo se mantienen a
+# propósito: los Page Objects dependen de la visibilidad CSS (menús, modales).
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+BLOCKED_URL_FRAGMENTS = (
+    "google-analytics",
+    "googletagmanager",
+    "doubleclick",
+    "hotjar",
+)
+
+
+def _block_resource(route: Route) -> None:
+    """Aborta recursos prescindibles y trackers; deja pasar el resto."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        fragment in request.url for fragment in BLOCKED_URL_FRAGMENTS
+    ):
+        route.abort()
+    else:
+        route.continue_()
+
+
+@contextmanager
+def new_session(
+    browser: Browser,
+    config: AppConfig,
+    storage_state: Optional[dict[str, Any]] = None,
+) -> Generator[Tuple[BrowserContext, Page], None, None]:
+    """Abre un par (context, page) nuevo sobre un navegador ya arrancado.
+
+    - Bloquea service workers y descargas, que el flujo no necesita.
+    - Con config.block_assets aborta imágenes, media, fuentes y trackers
+      conocidos. Desactivado por defecto: enrutar desactiva la caché HTTP del
+      contexto y hace pasar cada petición por Python.
+    - storage_state (cookies y localStorage de context.storage_state())
+      permite arrancar la sesión ya autenticada, sin repetir el login.
+
+    Args:
+        browser: Navegador ya lanzado.
+        config: Configuración de la aplicación.
+        storage_state: Sesión guardada con la que crear el contexto.
+
+    Returns:
+        Generador que produce la tupla (context, page).
+    """
+
+    context = browser.new_context(
+        service_workers="block",
+        accept_downloads=False,
+        storage_state=storage_state,
+    )
+    try:
+        if config.block_assets:
+            context.route("**/*", _block_resource)
+        page = context.new_page()
+        yield (context, page)
+    finally:
+        # Los errores de cierre no deben tapar el original, pero sí registrarse:
+        # si no, un cierre lento o fallido no se distingue de un cuelgue.
+        try:
+            context.close()
+        except Exception as exc:
+            get_logger(tarea="cerrar_navegador").warning(
+                "Error cerrando el contexto del navegador: %s", exc
+            )
 
 
 @contextmanager
-def launch_browser(config: Any) -> Generator[Tuple[Browser, Page], None, None]:
-    """Launch Chromium and yield (browser, page).
+def launch_browser(
+    config: AppConfig, storage_state: Optional[dict[str, Any]] = None
+) -> Generator[Tuple[Browser, Page], None, None]:
+    """Lanza Chromium y produce (browser, page).
+
+    - Usa config.effective_headless (headless=True cuando falta $DISPLAY).
+    - Aplica config.slow_mo_ms como slow_mo de Playwright.
+    - Añade --no-sandbox (habitual en contenedores) y, en headless,
+      HEADLESS_ARGS.
+    - La página sale de new_session(), con storage_state si se indica.
 
-    - Forces headless=True when $DISPLAY is missing.
-    - Adds --no-sandbox (common requirement in containers).
+    Args:
+        config: Configuración de la aplicación.
+        storage_state: Sesión guardada con la que crear el primer contexto.
 
-    The caller is expected to destructure as: (_, page).
+    Returns:
+        Generador que produce la tupla (browser, page); el llamador la
+        desestructura como (_, page).
     """
 
-    headless = _should_run_headless(config)
-    slow_mo = getattr(config, "slow_mo", None)
+    headless = config.effective_headless
+    slow_mo = config.slow_mo_ms or None
+    args = ["--no-sandbox"]
+    if headless:
+        args.extend(HEADLESS_ARGS)
 
     with sync_playwright() as p:
         browser: Browser = p.chromium.launch(
             headless=headless,
             slow_mo=slow_mo,
-            args=["--no-sandbox"],
+            args=args,
         )
-        context = browser.new_context()
-        page = context.new_page()
 
         try:
-            yield (browser, page)
+            with new_session(browser, config, storage_state) as (_, page):
+                yield (browser, page)
         finally:
-            # Close in reverse order; ignore errors on shutdown.
-            try:
-                context.close()
-            except Exception:
-                pass
             try:
                 browser.close()
-            except Exception:
-                pass
+            except Exception as exc:
+                get_logger(tarea="cerrar_navegador").warning(
+                    "Error cerrando el navegador: %s", exc
+                )
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from functools import partial
 from typing import Any, Callable, Dict
 
 try:
@@ -15,18 +16,26 @@ if load_dotenv:
     load_dotenv()
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AppConfig:
-    """Agrupa parametros compartidos por la CLI, los Page Objects y el workflow."""
+    """Agrupa parametros compartidos por la CLI, los Page Objects y el workflow.
+
+    Es inmutable: los valores se fijan en load_config (usar overrides para
+    forzar alguno desde la CLI).
+    """
 
     base_url: str
     username: str
     password: str
     headless: bool = False
+    effective_headless: bool = False
     navigation_timeout_ms: int = 30_000
     upload_timeout_ms: int = 120_000
-    slow_mo_ms: int = 250
+    slow_mo_ms: int = 0
     keep_browser_open: bool = True
+    block_assets: bool = False
+    epac_storage_state: str = ""
+    debug_phone: bool = False
     min_action_delay_s: float = 0.6
     max_action_delay_s: float = 2.4
     peritoline_login_url: str = ""
@@ -34,6 +43,13 @@ class AppConfig:
     peritoline_password: str = ""
 
 
+# Centinela para distinguir "sin override" de un override explícito a None.
+_MISSING = object()
+
+# Cadenas que _to_bool interpreta como verdadero.
+_BOOL_TRUE = frozenset({"1", "true", "yes", "on"})
+
+
 def _resolve(
     overrides: Dict[str, Any],
     field_name: str,
@@ -59,8 +75,9 @@ def _resolve(
         Valor resuelto para el campo.
     """
 
-    if field_name in overrides:
-        return overrides[field_name]
+    value = overrides.get(field_name, _MISSING)
+    if value is not _MISSING:
+        return value
 
     env_value = os.getenv(env_key)
     if env_value is not None:
@@ -79,7 +96,7 @@ def _to_bool(value: str) -> bool:
         Booleano equivalente.
     """
 
-    return value.strip().lower() in {"1", "true", "yes", "on"}
+    return value.strip().lower() in _BOOL_TRUE
 
 
 def _to_int(value: str, default: int) -> int:
@@ -116,6 +133,49 @@ def _to_float(value: str, default: float) -> float:
         return default
 
 
+# Tabla declarativa de campos: (campo, variable de entorno, defecto, caster).
+# Los casters se crean una sola vez al importar el módulo.
+_FIELDS: tuple[tuple[str, str, Any, Callable[[str], Any] | None], ...] = (
+    ("base_url", "APP_BASE_URL", "https://portal-ejemplo.com/login", None),
+    ("username", "APP_USERNAME", "USUARIO", None),
+    ("password", "APP_PASSWORD", "SECRETO", None),
+    ("headless", "APP_HEADLESS", False, _to_bool),
+    ("slow_mo_ms", "APP_SLOW_MO_MS", 0, partial(_to_int, default=0)),
+    ("keep_browser_open", "APP_KEEP_BROWSER_OPEN", True, _to_bool),
+    # Desactivado por defecto: enrutar desactiva la caché HTTP del contexto.
+    ("block_assets", "APP_BLOCK_ASSETS", False, _to_bool),
+    ("epac_storage_state", "EPAC_STORAGE_STATE", "", None),
+    ("debug_phone", "EPAC_DEBUG_PHONE", False, _to_bool),
+    (
+        "min_action_delay_s",
+        "APP_MIN_ACTION_DELAY_S",
+        0.6,
+        partial(_to_float, default=0.6),
+    ),
+    (
+        "max_action_delay_s",
+        "APP_MAX_ACTION_DELAY_S",
+        2.4,
+        partial(_to_float, default=2.4),
+    ),
+    (
+        "navigation_timeout_ms",
+        "APP_NAV_TIMEOUT_MS",
+        30_000,
+        partial(_to_int, default=30_000),
+    ),
+    ("peritoline_login_url", "PERITOLINE_LOGIN_URL", "", None),
+    ("peritoline_username", "PERITOLINE_USERNAME", "", None),
+    ("peritoline_password", "PERITOLINE_PASSWORD", "", None),
+    (
+        "upload_timeout_ms",
+        "APP_SUBMIT_TIMEOUT_MS",
+        120_000,
+        partial(_to_int, default=120_000),
+    ),
+)
+
+
 def load_config(overrides: Dict[str, Any] | None = None) -> AppConfig:
     """Construye una instancia de AppConfig lista para consumirse en el workflow.
 
@@ -132,83 +192,16 @@ def load_config(overrides: Dict[str, Any] | None = None) -> AppConfig:
     overrides = overrides or {}
 
     base_settings = {
-        "base_url": _resolve(
-            overrides,
-            "base_url",
-            "APP_BASE_URL",
-            "https://portal-ejemplo.com/login",
-        ),
-        "username": _resolve(overrides, "username", "APP_USERNAME", "USUARIO"),
-        "password": _resolve(overrides, "password", "APP_PASSWORD", "SECRETO"),
-        "headless": _resolve(
-            overrides,
-            "headless",
-            "APP_HEADLESS",
-            False,
-            caster=_to_bool,
-        ),
-        "slow_mo_ms": _resolve(
-            overrides,
-            "slow_mo_ms",
-            "APP_SLOW_MO_MS",
-            250,
-            caster=lambda value, default=250: _to_int(value, default),
-        ),
-        "keep_browser_open": _resolve(
-            overrides,
-            "keep_browser_open",
-            "APP_KEEP_BROWSER_OPEN",
-            True,
-            caster=_to_bool,
-        ),
-        "min_action_delay_s": _resolve(
-            overrides,
-            "min_action_delay_s",
-            "APP_MIN_ACTION_DELAY_S",
-            0.6,
-            caster=lambda value, default=0.6: _to_float(value, default),
-        ),
-        "max_action_delay_s": _resolve(
-            overrides,
-            "max_action_delay_s",
-            "APP_MAX_ACTION_DELAY_S",
-            2.4,
-            caster=lambda value, default=2.4: _to_float(value, default),
-        ),
-        "navigation_timeout_ms": _resolve(
-            overrides,
-            "navigation_timeout_ms",
-            "APP_NAV_TIMEOUT_MS",
-            30_000,
-            caster=lambda value, default=30_000: _to_int(value, default),
-        ),
-        "peritoline_login_url": _resolve(
-            overrides,
-            "peritoline_login_url",
-            "PERITOLINE_LOGIN_URL",
-            "",
-        ),
-        "peritoline_username": _resolve(
-            overrides,
-            "peritoline_username",
-            "PERITOLINE_USERNAME",
-            "",
-        ),
-        "peritoline_password": _resolve(
-            overrides,
-            "peritoline_password",
-            "PERITOLINE_PASSWORD",
-            "",
-        ),
-        "upload_timeout_ms": _resolve(
-            overrides,
-            "upload_timeout_ms",
-            "APP_SUBMIT_TIMEOUT_MS",
-            120_000,
-            caster=lambda value, default=120_000: _to_int(value, default),
-        ),
+        field_name: _resolve(overrides, field_name, env_key, default, caster)
+        for field_name, env_key, default, caster in _FIELDS
     }
 
+    # Sin servidor X ($DISPLAY) Chromium no puede abrirse con interfaz, así
+    # que se fuerza headless una sola vez aquí en lugar de en cada arranque.
+    base_settings["effective_headless"] = bool(
+        base_settings["headless"] or not os.environ.get("DISPLAY")
+    )
+
     min_delay = base_settings["min_action_delay_s"]
     max_delay = base_settings["max_action_delay_s"]
     if min_delay > max_delay:
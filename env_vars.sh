@@ -26,7 +26,7 @@ export PIPELINE_MODELO=epac
 
 # Opcionales
 export APP_HEADLESS=false
-export APP_SLOW_MO_MS=250
+export APP_SLOW_MO_MS=0
 export APP_KEEP_BROWSER_OPEN=false
 export APP_MIN_ACTION_DELAY_S=0.6
 export APP_MAX_ACTION_DELAY_S=2.4
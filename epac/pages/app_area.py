@@ -0,0 +1,5 @@
+"""Iframe ``appArea`` del portal ePAC, compartido por los Page Objects."""
+
+# Nombre del frame donde ePAC pinta la aplicación (búsqueda, menú lateral, ficha)
+APP_AREA_FRAME_NAME = "appArea"
+APP_AREA_IFRAME_SELECTOR = f"iframe[name='{APP_AREA_FRAME_NAME}']"
@@ -3,31 +3,142 @@
 from __future__ import annotations
 
 import re
-from playwright.sync_api import Page
+from functools import lru_cache
+
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import Frame, Page
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 import phonenumbers
 from phonenumbers import NumberParseException
 from phonenumbers.phonenumberutil import number_type, PhoneNumberType
 
+from epac.pages.app_area import APP_AREA_FRAME_NAME, APP_AREA_IFRAME_SELECTOR
+
+
+# Etiquetas de la ficha localizadas en una sola pasada sobre el texto:
+# - obs/desc: cabeceras de sección (se usa su última aparición).
+# - telef1/telef2: campo y valor (se usa la primera aparición con valor).
+SECCIONES_RE = re.compile(
+    r"(?P<obs>OBSERVACIONES MANUALES:)"
+    r"|(?P<desc>DESCRIPCION:)"
+    r"|(?i:TELEF-1)\s*:?\s*(?P<telef1>[+0-9][0-9\s().,\-]{6,})"
+    r"|(?i:TELEF-2)\s*:?\s*(?P<telef2>[+0-9][0-9\s().,\-]{6,})"
+)
+
+
+# Rangos móviles de los países más habituales en ePAC:
+# prefijo de país -> {longitud del número nacional: prefijos nacionales móviles}.
+# Solo incluye rangos que phonenumbers clasifica siempre como MOBILE; lo que no
+# encaja aquí se sigue resolviendo con phonenumbers.
+MOVILES_POR_PAIS: dict[str, dict[int, tuple[str, ...]]] = {
+    "34": {9: ("6", "71", "72", "73", "74", "78")},  # España
+    "351": {9: ("91", "92", "93", "96")},  # Portugal
+    "33": {9: ("60", "61", "62", "64", "65", "66", "67", "68",
+               "73", "74", "75", "76", "77", "78", "79")},  # Francia
+    "39": {
+        9: ("32", "33", "34", "35", "36", "37", "38", "39"),
+        10: ("31", "32", "33", "34", "35", "36", "37", "38", "39"),
+    },  # Italia
+    "44": {10: ("71", "72", "73", "74", "75", "78")},  # Reino Unido
+    "49": {10: ("17",), 11: ("17",)},  # Alemania
+}
+
+
+def _es_movil_conocido(tel_norm: str) -> bool:
+    """True si tel_norm (+ y dígitos) cae en un rango móvil de MOVILES_POR_PAIS.
+
+    Los prefijos de país E.164 no se solapan, así que como mucho uno de los
+    tres cortes posibles (1, 2 o 3 dígitos) está en la tabla.
+    """
+    for fin in (2, 3, 4):
+        rangos = MOVILES_POR_PAIS.get(tel_norm[1:fin])
+        if rangos is not None:
+            nacional = tel_norm[fin:]
+            prefijos = rangos.get(len(nacional))
+            return prefijos is not None and nacional.startswith(prefijos)
+    return False
+
+
+@lru_cache(maxsize=4096)
+def _clasificar_movil_internacional(tel_norm: str) -> bool:
+    """Clasifica un número internacional ya normalizado (+ y dígitos) con phonenumbers.
+
+    Se memoiza porque parse/is_valid_number/number_type son caros y el mismo
+    candidato aparece varias veces (secciones repetidas, reintentos, fichas
+    del mismo asegurado).
+    """
+    try:
+        num = phonenumbers.parse(tel_norm, None)
+        if not phonenumbers.is_valid_number(num):
+            return False
 
-class EpacFichaPeritacionPage:
-    """Extrae teléfono del texto de la ficha del siniestro."""
+        t = number_type(num)
+        return t in (PhoneNumberType.MOBILE, PhoneNumberType.FIXED_LINE_OR_MOBILE)
 
-    IFRAME_SELECTOR = "iframe[name='appArea']"
+    except NumberParseException:
+        return False
 
-    # Candidatos tipo teléfono: +/00 opcional + dígitos con separadores
-    PHONE_CANDIDATE_RE = re.compile(r"(?:\+|00)?\s*\d[\d\s().,\-]{6,}\d",re.UNICODE)
 
-    # Delimitadores típicos tras secciones (para no tragarnos la tabla "SINIESTROS")
-    CUT_PATTERNS = [
-        re.compile(r"\n\s*-{10,}\s*\n", re.MULTILINE),
-        re.compile(r"\n\s*SINIESTROS\s*\n", re.IGNORECASE),
-        re.compile(r"\n\s*NUMERO\s+FECHA\s+RESERVA\s+", re.IGNORECASE),
-    ]
+class EpacFichaPeritacionPage:
+    """Extrae teléfono del texto de la ficha del siniestro."""
 
-    def __init__(self, page: Page) -> None:
+    IFRAME_SELECTOR = APP_AREA_IFRAME_SELECTOR
+
+    # Candidatos tipo teléfono: +/00 opcional + dígitos con separadores.
+    # Sin prefijo, el candidato no puede arrancar a mitad de un bloque de
+    # espacios: el textContent de la ficha trae sangrías de miles de espacios y
+    # reintentar desde cada uno de ellos hace la búsqueda cuadrática. Los
+    # candidatos encontrados son los mismos (el primer espacio del bloque ya
+    # cubre ese arranque).
+    PHONE_CANDIDATE_RE = re.compile(r"(?:\+|00|(?<!\s))\s*\d[\d\s().,\-]{6,}\d", re.UNICODE)
+
+    # Delimitadores típicos tras secciones (para no tragarnos la tabla "SINIESTROS"):
+    # línea de guiones, cabecera "SINIESTROS" o cabecera "NUMERO FECHA RESERVA".
+    # Una sola alternancia: search() devuelve directamente el corte más cercano.
+    CUT_RE = re.compile(
+        r"\n\s*(?:-{10,}\s*\n|SINIESTROS\s*\n|NUMERO\s+FECHA\s+RESERVA\s+)",
+        re.IGNORECASE,
+    )
+
+    # Tamaño máximo de una sección y ventana en la que se busca su delimitador
+    SECCION_MAX_CHARS = 400
+    SECCION_VENTANA_CHARS = 2000
+
+    # Texto de la ficha (textContent del body, no innerText, para evitar
+    # problemas de visibilidad/render) si ya está cargada: contiene TELEF-1
+    # (campo propio de la ficha, no de la pantalla de detalle previa al clic),
+    # al menos 2 palabras clave y más de 800 caracteres útiles. Si no, "".
+    FICHA_TEXTO_JS = """() => {
+        const t = document.body ? (document.body.textContent || "") : "";
+        const u = t.toUpperCase();
+        if (u.indexOf("TELEF-1") < 0) return "";
+        let score = 0;
+        for (const n of ["SINIESTROS", "PERITAJE", "TELEF-1", "TELEF-2"]) {
+            if (u.indexOf(n) >= 0) score++;
+        }
+        return score >= 2 && t.trim().length > 800 ? t : "";
+    }"""
+    # Espera máxima a que la ficha cargue antes de pasar a los fallbacks;
+    # wait_for_function vuelve en cuanto aparece, el tope solo pesa si falla.
+    FICHA_ESPERA_MS = 5_000
+
+    # Corte del valor de TELEF-1/TELEF-2 antes de un "HORA" contiguo
+    HORA_RE = re.compile(r"\bHORA\b", re.IGNORECASE)
+
+    # Todo lo que no es dígito (separadores, '+', letras sueltas...)
+    NONDIGIT_RE = re.compile(r"\D")
+
+    # Separadores habituales de un candidato (y '+'), eliminados con str.translate
+    SEPARADORES_TABLE = str.maketrans("", "", " \t\n\r\x0b\x0c\u00A0().,-+")
+    # Los mismos separadores ASCII, para bytes.translate (caso habitual)
+    SEPARADORES_ASCII = b" \t\n\r\x0b\x0c().,-+"
+
+    def __init__(self, page: Page, debug: bool = False) -> None:
         self.page = page
         self.frame = page.frame_locator(self.IFRAME_SELECTOR)
+        # Trazas de diagnóstico (copian la ficha entera): AppConfig.debug_phone
+        self.debug = debug
 
     # ---------------------------
     # API pública
@@ -38,40 +149,53 @@ class EpacFichaPeritacionPage:
         """
         try:
             texto_completo = self._obtener_texto_ficha()
-            print(f"DEBUG len(texto)={len(texto_completo)} TELEF={'TELEF' in texto_completo.upper()}")
+            if self.debug:
+                print(f"DEBUG len(texto)={len(texto_completo)} TELEF={'TELEF' in texto_completo.upper()}")
 
             if not texto_completo:
                 print("  ⚠ No se pudo obtener el texto de la ficha")
                 return None
 
+            secciones = self._localizar_secciones(texto_completo)
+            telefono = None
+
             # 1) OBSERVACIONES MANUALES
-            telefono = self._buscar_en_seccion(texto_completo, "OBSERVACIONES MANUALES:")
-            if telefono:
-                print(f"  ✓ Teléfono encontrado en 'OBSERVACIONES MANUALES': {telefono}")
-                return telefono
+            m = secciones.get("obs")
+            if m:
+                telefono = self._buscar_en_seccion(texto_completo, m.end(), "OBSERVACIONES MANUALES:")
+                if telefono:
+                    print(f"  ✓ Teléfono encontrado en 'OBSERVACIONES MANUALES': {telefono}")
+                    return telefono
 
             # 2) DESCRIPCION
-            telefono = self._buscar_en_seccion(texto_completo, "DESCRIPCION:")
-            if telefono:
-                print(f"  ✓ Teléfono encontrado en 'DESCRIPCION': {telefono}")
-                return telefono
+            m = secciones.get("desc")
+            if m:
+                telefono = self._buscar_en_seccion(texto_completo, m.end(), "DESCRIPCION:")
+                if telefono:
+                    print(f"  ✓ Teléfono encontrado en 'DESCRIPCION': {telefono}")
+                    return telefono
 
             # 3) TELEF-1
-            telefono = self._buscar_campo_telef(texto_completo, "TELEF-1:")
-            if telefono:
-                print(f"  ✓ Teléfono encontrado en 'TELEF-1': {telefono}")
-                return telefono
+            m = secciones.get("telef1")
+            if m:
+                telefono = self._buscar_campo_telef(m.group("telef1"), "TELEF-1:")
+                if telefono:
+                    print(f"  ✓ Teléfono encontrado en 'TELEF-1': {telefono}")
+                    return telefono
 
             # 4) TELEF-2
-            telefono = self._buscar_campo_telef(texto_completo, "TELEF-2:")
-            if telefono:
-                print(f"  ✓ Teléfono encontrado en 'TELEF-2': {telefono}")
-                return telefono
+            m = secciones.get("telef2")
+            if m:
+                telefono = self._buscar_campo_telef(m.group("telef2"), "TELEF-2:")
+                if telefono:
+                    print(f"  ✓ Teléfono encontrado en 'TELEF-2': {telefono}")
+                    return telefono
             
-            if not telefono:
+            if self.debug:
                 print("  DEBUG: muestro 20 líneas alrededor de TELEF-1/TELEF-2")
+                texto_upper = texto_completo.upper()
                 for key in ["TELEF-1", "TELEF-2", "OBSERVACIONES MANUALES", "DESCRIPCION"]:
-                    idx = texto_completo.upper().find(key)
+                    idx = texto_upper.find(key)
                     if idx != -1:
                         print("\n---", key, "---")
                         print(texto_completo[max(0, idx-200): idx+400])
@@ -89,124 +213,120 @@ class EpacFichaPeritacionPage:
     def _obtener_texto_ficha(self) -> str:
         """
         Obtiene el texto completo de la ficha de forma robusta:
-        1) buscar un nodo dentro del iframe que contenga 'SINIESTROS'/'PERITAJE'/'TELEF'
-        y devolver su textContent (sirve aunque no sea visible)
+        1) textContent del body del iframe cuando contiene 'TELEF-1' y al menos
+        2 de 'SINIESTROS'/'PERITAJE'/'TELEF-1'/'TELEF-2' (sirve aunque no sea
+        visible); se espera hasta FICHA_ESPERA_MS a que la ficha cargue
         2) fallback: body.innerText
         """
         try:
-            frm = self.page.frame(name="appArea")
+            frm = self.page.frame(name=APP_AREA_FRAME_NAME)
             if not frm:
                 return ""
 
+            # El clic en el menú recarga el iframe, pero la navegación puede no
+            # haber empezado aún: el documento actual sería todavía el previo.
+            # La espera real a la ficha es la marca TELEF-1 de FICHA_TEXTO_JS.
             frm.wait_for_selector("body", state="attached", timeout=15000)
 
-            # 1) Intentar localizar el contenedor real de la ficha
-            # Buscamos un elemento que contenga palabras clave típicas.
-            # Usamos textContent (no innerText) para evitar problemas de visibilidad/render.
-            for attempt in range(3):
-                handle = frm.evaluate_handle(
-                    """() => {
-                        const needles = ["SINIESTROS", "PERITAJE", "TELEF-1", "TELEF-2"];
-                        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_ELEMENT);
-                        let best = null;
-                        while (walker.nextNode()) {
-                        const el = walker.currentNode;
-                        const tc = (el.textContent || "").toUpperCase();
-                        // candidato: contiene al menos 2 needles y tiene bastante texto
-                        let score = 0;
-                        for (const n of needles) if (tc.includes(n)) score++;
-                        if (score >= 2 && tc.length > 800) {
-                            best = el;
-                            break;
-                        }
-                        }
-                        return best;
-                    }"""
-                )
-
-                # Si encontramos elemento, devolvemos su textContent
-                if handle:
-                    try:
-                        txt = frm.evaluate("(el) => el ? (el.textContent || '') : ''", handle) or ""
-                        txt = txt.strip()
-                        if len(txt) > 800:
-                            return txt
-                    except Exception:
-                        pass
-
-                self.page.wait_for_timeout(400)
-
-            # 2) Fallback: intentar pre/textarea grande
-            for sel in ["pre", "textarea"]:
-                try:
-                    loc = frm.query_selector(sel)
-                    if loc:
-                        txt = frm.evaluate("(el) => el.textContent || ''", loc) or ""
-                        txt = (txt or "").strip()
-                        if len(txt) > 800:
-                            return txt
-                except Exception:
-                    pass
-
-            # 3) Último fallback: body.innerText
-            txt = frm.evaluate("() => document.body ? document.body.innerText : ''") or ""
-            return (txt or "").strip()
+            return self._leer_texto_frame(frm)
 
         except Exception as e:
             print(f"  ERROR obteniendo texto ficha: {e}")
             return ""
 
+    def _leer_texto_frame(self, frm: Frame) -> str:
+        """Lee el texto de la ficha del iframe ya cargado (ver _obtener_texto_ficha)."""
+        # 1) Texto completo de la ficha: si ya está cargada, un solo evaluate;
+        # si no, se espera a que lo esté (sondeando en el navegador) en lugar
+        # de dormir entre reintentos. Si el iframe navega durante el evaluate
+        # ("Execution context was destroyed"), wait_for_function lo repite en
+        # el documento nuevo.
+        try:
+            raw = frm.evaluate(self.FICHA_TEXTO_JS) or ""
+        except PlaywrightError:
+            raw = ""
+        if raw:
+            return raw.strip()
+        try:
+            handle = frm.wait_for_function(
+                self.FICHA_TEXTO_JS, timeout=self.FICHA_ESPERA_MS, polling=100
+            )
+            return (handle.json_value() or "").strip()
+        except PlaywrightTimeoutError:
+            pass
+
+        # 2) Fallback: primer pre/textarea con texto suficiente, en un solo evaluate
+        try:
+            raw = frm.evaluate(
+                """() => {
+                    for (const sel of ["pre", "textarea"]) {
+                        const el = document.querySelector(sel);
+                        const t = el ? (el.textContent || "") : "";
+                        if (t.trim().length > 800) return t;
+                    }
+                    return "";
+                }"""
+            ) or ""
+            if raw:
+                return raw.strip()
+        except Exception:
+            pass
+
+        # 3) Último fallback: body.innerText
+        raw = frm.evaluate("() => document.body ? document.body.innerText : ''") or ""
+        return raw.strip()
+
     # ---------------------------
     # Búsquedas por prioridad
     # ---------------------------
-    def _buscar_en_seccion(self, texto: str, etiqueta_seccion: str) -> str | None:
-        """Busca teléfono dentro de una sección de texto (cortando antes de tablas/delimitadores)."""
-        try:
-            pos = texto.rfind(etiqueta_seccion)
-            if pos == -1:
-                return None
+    def _localizar_secciones(self, texto: str) -> dict[str, re.Match[str]]:
+        """Localiza todas las etiquetas de interés recorriendo el texto una vez.
 
-            # Tomar desde justo después del label
-            start = pos + len(etiqueta_seccion)
-            chunk = texto[start:]
-
-            # Cortar por delimitadores típicos (para evitar pillar números de tablas)
-            cut_idx = None
-            for pat in self.CUT_PATTERNS:
-                m = pat.search(chunk)
-                if m:
-                    if cut_idx is None or m.start() < cut_idx:
-                        cut_idx = m.start()
-
-            if cut_idx is not None:
-                chunk = chunk[:cut_idx]
-
-            # Limitamos tamaño igualmente (sección “real”)
-            chunk = chunk[:400]
+        Devuelve, por grupo de SECCIONES_RE, la última aparición de las
+        cabeceras de sección (obs/desc) y la primera de los campos TELEF.
+        """
+        encontrados: dict[str, re.Match[str]] = {}
+        for m in SECCIONES_RE.finditer(texto):
+            grupo = m.lastgroup
+            if grupo in ("obs", "desc") or grupo not in encontrados:
+                encontrados[grupo] = m
+        return encontrados
+
+    def _buscar_en_seccion(self, texto: str, start: int, etiqueta_seccion: str) -> str | None:
+        """Busca teléfono dentro de una sección de texto (cortando antes de tablas/delimitadores).
+
+        Args:
+            texto: Texto completo de la ficha.
+            start: Posición justo después de la etiqueta de la sección.
+            etiqueta_seccion: Nombre de la sección (solo para trazas).
+        """
+        try:
+            # Cortar por delimitadores típicos (para evitar pillar números de tablas).
+            # Basta con mirar una ventana acotada: la sección nunca pasa de
+            # SECCION_MAX_CHARS y así no se recorre el resto de la ficha.
+            fin = start + self.SECCION_MAX_CHARS
+            m = self.CUT_RE.search(texto, start, start + self.SECCION_VENTANA_CHARS)
+            if m and m.start() < fin:
+                fin = m.start()
 
-            return self._extraer_numero_telefono(chunk)
+            # Se escanea en sitio (pos/endpos) y se para en el primer móvil válido.
+            return self._extraer_numero_telefono(texto, start, fin)
 
         except Exception as e:
             print(f"  - Error buscando en sección '{etiqueta_seccion}': {e}")
             return None
 
-    def _buscar_campo_telef(self, texto: str, campo: str) -> str | None:
-        # Busca teléfono en TELEF-1 / TELEF-2 aunque el texto venga como:
+    def _buscar_campo_telef(self, valor: str, campo: str) -> str | None:
+        # Extrae el teléfono del valor de TELEF-1 / TELEF-2 ya localizado por
+        # SECCIONES_RE, que acepta el texto como:
         #   - "TELEF-1:00685789868"
         #   - "TELEF-1 : 00685789868"
         #   - "TELEF-1 00685789868"
         # y aunque lleve puntos/comas/espacios.
 
         try:
-            campo_base = campo.replace(":", "").strip()   # TELEF-1 / TELEF-2
-            patron = rf"{re.escape(campo_base)}\s*:?\s*([+0-9][0-9\s().,\-]{{6,}})"
-            m = re.search(patron, texto, flags=re.IGNORECASE)
-            if not m:
-                return None
-
-            valor = m.group(1)
             # cortar por "HORA" si existe
-            valor = re.split(r"\bHORA\b", valor, flags=re.IGNORECASE)[0].strip()
+            valor = self.HORA_RE.split(valor, maxsplit=1)[0].strip()
 
             return self._extraer_numero_telefono(valor)
 
@@ -217,11 +337,17 @@ class EpacFichaPeritacionPage:
     # ---------------------------
     # Extracción + normalización
     # ---------------------------
-    def _extraer_numero_telefono(self, texto: str) -> str | None:
+    def _extraer_numero_telefono(
+        self, texto: str, pos: int = 0, endpos: int | None = None
+    ) -> str | None:
+        """Devuelve el primer móvil válido de texto[pos:endpos] sin copiar el tramo."""
         if not texto:
             return None
 
-        for m in self.PHONE_CANDIDATE_RE.finditer(texto):
+        if endpos is None:
+            endpos = len(texto)
+
+        for m in self.PHONE_CANDIDATE_RE.finditer(texto, pos, endpos):
             candidato = m.group(0)
             tel = self._normalizar_telefono(candidato)
             if not tel:
@@ -234,10 +360,31 @@ class EpacFichaPeritacionPage:
 
         return None
 
+    def _solo_digitos(self, s: str) -> str:
+        """Deja solo los dígitos de s.
+
+        translate quita los separadores habituales sin pasar por el motor de
+        regex (sobre bytes si s es ASCII, que es lo habitual y más rápido); solo
+        si queda algo que no son dígitos (espacios Unicode raros, letras...) se
+        recurre a NONDIGIT_RE.
+        """
+        if s.isascii():
+            digits = s.encode("ascii").translate(None, self.SEPARADORES_ASCII).decode("ascii")
+        else:
+            digits = s.translate(self.SEPARADORES_TABLE)
+        if not digits or digits.isdecimal():
+            return digits
+        return self.NONDIGIT_RE.sub("", digits)
+
     def _normalizar_telefono(self, raw: str) -> str | None:
         if not raw:
             return None
 
+        # Camino rápido: el caso ePAC habitual es un nacional ES de 9 dígitos
+        # ya limpio, que el resto de ramas devolverían tal cual.
+        if len(raw) == 9 and raw.isdecimal() and not raw.startswith("00"):
+            return raw
+
         s = raw.strip()
 
         # Quita separadores típicos
@@ -245,7 +392,7 @@ class EpacFichaPeritacionPage:
 
         # Caso ePAC: 00 + 9 dígitos españoles (sin país). No es internacional real.
         if s.startswith("00"):
-            rest_digits = re.sub(r"\D", "", s[2:])
+            rest_digits = self._solo_digitos(s[2:])
             # móvil ES
             if len(rest_digits) == 9 and rest_digits[0] in "67":
                 return rest_digits
@@ -257,13 +404,13 @@ class EpacFichaPeritacionPage:
 
         # Si ya viene con +, dejamos solo + y dígitos
         if s.startswith("+"):
-            s = "+" + re.sub(r"\D", "", s[1:])
+            s = "+" + self._solo_digitos(s[1:])
             if 8 <= (len(s) - 1) <= 15:
                 return s
             return None
 
         # Si no viene con +, dejamos solo dígitos
-        digits = re.sub(r"\D", "", s)
+        digits = self._solo_digitos(s)
         if not digits:
             return None
 
@@ -300,20 +447,14 @@ class EpacFichaPeritacionPage:
         if not tel_norm.startswith("+"):
             return len(tel_norm) == 9 and tel_norm[0] in "67"
 
-        # Internacional: usa phonenumbers si está disponible
+        # Internacional: tabla de rangos móviles conocidos (sin phonenumbers)
+        if _es_movil_conocido(tel_norm):
+            return True
+
+        # Resto: usa phonenumbers si está disponible
         if phonenumbers is None:
             # Fallback: si no tenemos librería, no podemos asegurar => lo aceptamos
             # para no perder móviles extranjeros.
             return True
 
-        try:
-            num = phonenumbers.parse(tel_norm, None)
-            if not phonenumbers.is_valid_number(num):
-                return False
-
-            t = number_type(num)
-            return t in (PhoneNumberType.MOBILE, PhoneNumberType.FIXED_LINE_OR_MOBILE)
-
-        except NumberParseException:
-            return False
-
+        return _clasificar_movil_internacional(tel_norm)
@@ -29,25 +29,30 @@ class LoginPage:
         """
 
         self.page = page
+        # Locators del formulario: se construyen una sola vez por instancia.
+        self.username_input_locator = page.locator(self.username_input_selector)
+        self.password_input_locator = page.locator(self.password_input_selector)
+        self.submit_button_locator = page.locator(self.submit_button_selector)
 
     # Documentación MkDocs:
     # - Propósito: navegar a la URL de login y validar el formulario.
-    # - Entradas: url de inicio de sesión.
+    # - Entradas: url de inicio de sesión y evento de carga a esperar.
     # - Salidas: ninguna.
-    def open(self, url: str) -> None:
+    def open(self, url: str, wait_until: str = "domcontentloaded") -> None:
         """Navega a la URL de login y espera hasta que aparezca el formulario.
 
         Args:
             url: URL de inicio de sesión.
+            wait_until: Evento de carga que da por terminada la navegación. Por
+                defecto no se espera a imágenes ni scripts de terceros: lo que
+                importa es el campo de usuario, que se espera a continuación.
 
         Returns:
             None.
         """
 
-        self.page.goto(url)
-        expect(
-            self.page.locator(self.username_input_selector)
-        ).to_be_visible()
+        self.page.goto(url, wait_until=wait_until)
+        expect(self.username_input_locator).to_be_visible()
 
     # Documentación MkDocs:
     # - Propósito: completar credenciales con parámetros o variables de entorno.
@@ -66,9 +71,9 @@ class LoginPage:
 
         username = username or self._env_or_raise("APP_USERNAME")
         password = password or self._env_or_raise("APP_PASSWORD")
-        self.page.fill(self.username_input_selector, username)
-        self.page.fill(self.password_input_selector, password)
-        self.page.click(self.submit_button_selector)
+        self.username_input_locator.fill(username)
+        self.password_input_locator.fill(password)
+        self.submit_button_locator.click()
 
     # Documentación MkDocs:
     # - Propósito: obtener una variable de entorno obligatoria.
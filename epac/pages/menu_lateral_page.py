@@ -1,19 +1,28 @@
-from playwright.sync_api import Page, expect
+from playwright.sync_api import Page
+
+from epac.pages.app_area import APP_AREA_IFRAME_SELECTOR
 from utils.logging_utils import get_logger
 
 
 class MenuLateralPage:
-    IFRAME_SELECTOR = "iframe[name='appArea']"
+    IFRAME_SELECTOR = APP_AREA_IFRAME_SELECTOR
 
-    HSC_FP_NODE = "div.divOptionTreeMenu:has-text('HSC y FP')"
-    FICHA_PERITACION_NODE = "div.divOptionTreeMenu:has-text('Ficha peritación')"
+    # Nodos del árbol filtrados con has_text (filtro nativo del locator) en
+    # lugar del pseudo-selector :has-text.
+    MENU_NODE = "div.divOptionTreeMenu"
+    HSC_FP_TEXT = "HSC y FP"
+    FICHA_PERITACION_TEXT = "Ficha peritación"
 
     def __init__(self, page: Page, siniestro: str = "sin_codigo"):
         self.page = page                 # ✅ GUARDAR PAGE
         self.frame = page.frame_locator(self.IFRAME_SELECTOR)
         self.siniestro = siniestro
+        self.hsc_locator = self.frame.locator(self.MENU_NODE, has_text=self.HSC_FP_TEXT).first
+        self.ficha_locator = self.frame.locator(
+            self.MENU_NODE, has_text=self.FICHA_PERITACION_TEXT
+        ).first
 
-    def abrir_ficha_peritacion(self) -> None:
+    def abrir_ficha_peritacion(self, timeout_ms: int = 15_000) -> None:
         logger = get_logger(
             siniestro=self.siniestro,
             tarea="abrir_ficha_peritacion"
@@ -21,14 +30,10 @@ class MenuLateralPage:
 
         logger.info("Abriendo menú HSC y FP")
 
-        hsc = self.frame.locator(self.HSC_FP_NODE).first
-        expect(hsc).to_be_visible(timeout=15_000)
-        hsc.click()
+        # click ya espera a que el nodo sea visible y accionable: sin expect previo.
+        self.hsc_locator.click(timeout=timeout_ms)
 
         logger.info("Seleccionando Ficha peritación")
 
-        ficha = self.frame.locator(self.FICHA_PERITACION_NODE).first
-        expect(ficha).to_be_visible(timeout=15_000)
-        ficha.click()
-
-        self.page.wait_for_timeout(500)
+        # Sin pausa fija: EpacFichaPeritacionPage espera a que la ficha cargue.
+        self.ficha_locator.click(timeout=timeout_ms)
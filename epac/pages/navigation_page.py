@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from playwright.sync_api import Page, expect
+from playwright.sync_api import Page
 
 from config import AppConfig
 
@@ -23,6 +23,14 @@ class NavigationPage:
 
         self.page = page
         self.config = config
+        # Locators del menú: se resuelven una vez por instancia y se reutilizan
+        # en cada vuelta a Peritaciones Diversos.
+        self.aplic_allianz_locator = page.get_by_role(
+            "menuitem", name="Aplic. Allianz", exact=True
+        )
+        self.informe_locator = page.get_by_role(
+            "menuitem", name="Informe Pericial Diversos SEA", exact=True
+        )
 
     def goto_informe_pericial_diversos_sea(self) -> None:
         """Abre el submenu 'Informe Pericial Diversos SEA' dentro de Aplic. Allianz.
@@ -31,14 +39,6 @@ class NavigationPage:
             None.
         """
 
-        aplic_allianz_link = self.page.get_by_role(
-            "menuitem", name="Aplic. Allianz", exact=True
-        )
-        expect(aplic_allianz_link).to_be_visible()
-        aplic_allianz_link.click()
-
-        informe_link = self.page.get_by_role(
-            "menuitem", name="Informe Pericial Diversos SEA", exact=True
-        )
-        expect(informe_link).to_be_visible()
-        informe_link.click()
+        # click ya espera a que cada menuitem sea visible y accionable.
+        self.aplic_allianz_locator.click()
+        self.informe_locator.click()
@@ -2,14 +2,19 @@
 
 from __future__ import annotations
 from playwright.sync_api import FrameLocator, Page, expect
+
+from epac.pages.app_area import APP_AREA_IFRAME_SELECTOR
 from utils.logging_utils import get_logger
 
 class NumeroSiniestroPage:
     """Encapsula las interacciones con el formulario de búsqueda de siniestros."""
 
-    iframe_selector = "iframe[name='appArea']"
+    iframe_selector = APP_AREA_IFRAME_SELECTOR
     siniestro_input = "#claimNumber"
-    enviar_button = "div.sectionButton:has-text('Enviar')"
+    # Botón como contenedor + has_text (filtro nativo, sin :has-text).
+    enviar_button_container = "div.sectionButton"
+    enviar_button_text = "Enviar"
+    enviar_button = f"{enviar_button_container}:has-text('{enviar_button_text}')"
     result_table = "#ordersList_tbody"
     # Alias por compatibilidad con referencias externas existentes.
     IFRAME_SELECTOR = iframe_selector
@@ -35,6 +40,14 @@ class NumeroSiniestroPage:
             self.frame = scope.frame_locator(self.iframe_selector)
         else:
             self.frame = scope
+        # Locators fijos del formulario: se construyen una sola vez por instancia.
+        self.siniestro_input_locator = self.frame.locator(self.siniestro_input)
+        self.enviar_button_locator = self.frame.locator(
+            self.enviar_button_container, has_text=self.enviar_button_text
+        )
+        self.result_rows_locator = self.frame.locator(
+            f"{self.result_table} tr.table-row"
+        )
 
     # Documentación MkDocs:
     # - Propósito: esperar el estado listo del formulario.
@@ -46,15 +59,9 @@ class NumeroSiniestroPage:
         Returns:
             None.
         """
-        if hasattr(self.scope, "wait_for_load_state"):
-            try:
-                self.scope.wait_for_load_state("domcontentloaded")
-            except Exception:
-                pass
-
-        locator = self.frame.locator(self.siniestro_input)
+        locator = self.siniestro_input_locator
         locator.wait_for(state="visible", timeout=60_000)
-        expect(locator).to_be_visible()
+        # La visibilidad ya está garantizada por wait_for; solo falta habilitado.
         expect(locator).to_be_enabled()
 
     # Documentación MkDocs:
@@ -73,10 +80,8 @@ class NumeroSiniestroPage:
         logger = get_logger(siniestro=codigo, tarea="ingresar_siniestro")
         logger.info("Ingresando siniestro")
 
-        input_box = self.frame.locator(self.siniestro_input)
-        input_box.click()
-        # Limpiar primero y usar fill en lugar de type.
-        input_box.fill("")
+        input_box = self.siniestro_input_locator
+        # fill ya enfoca y reemplaza el valor previo en una sola llamada.
         input_box.fill(codigo)
         expect(input_box).to_have_value(codigo, timeout=10_000)
 
@@ -90,9 +95,8 @@ class NumeroSiniestroPage:
         Returns:
             None.
         """
-        boton = self.frame.locator(self.enviar_button)
-        expect(boton).to_be_visible()
-        boton.click()
+        # click ya espera visible/habilitado/estable y hace scroll si hace falta.
+        self.enviar_button_locator.click(timeout=15_000)
 
     # Documentación MkDocs:
     # - Propósito: seleccionar el resultado que coincide con el código.
@@ -110,9 +114,8 @@ class NumeroSiniestroPage:
         logger = get_logger(siniestro=codigo, tarea="seleccionar_resultado")
         logger.info("Esperando resultados del siniestro")
 
-        tbody = self.frame.locator(self.result_table)
-        expect(tbody).to_be_visible()
-        row_locator = tbody.locator("tr.table-row")
+        # Una fila visible implica tabla visible: basta una sola espera.
+        row_locator = self.result_rows_locator
         row_locator.first.wait_for(state="visible", timeout=15_000)
         target_row = row_locator.filter(has_text=codigo)
         if target_row.count() == 0:
@@ -16,15 +16,18 @@ import argparse
 import os
 import subprocess
 import sys
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
+from itertools import chain
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import mysql.connector
 from mysql.connector import Error
 from mysql.connector.constants import ClientFlag
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from dotenv import load_dotenv
 
@@ -34,6 +37,20 @@ load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
 # Directorio de salida - ruta relativa al directorio actual
 OUTPUT_DIR = Path("./data/peritoline/raw_allianz")
 
+# Columnas del Excel exportado y sus anchos (letra de columna -> ancho)
+EXPORT_HEADERS = ["Encargo", "Fecha Sin.", "Causa", "Aseguradora", "Asegurado", "Dirección", "CP", "Municipio"]
+EXPORT_WIDTHS = {
+    "A": 16,  # Encargo
+    "B": 14,  # Fecha Sin.
+    "C": 30,  # Causa
+    "D": 16,  # Aseguradora
+    "E": 30,  # Asegurado
+    "F": 40,  # Dirección
+    "G": 10,  # CP
+    "H": 25,  # Municipio
+}
+
+
 @dataclass
 class DbConfig:
     host: str
@@ -84,6 +101,18 @@ enc_info AS (
     MAX(CASE WHEN rn=2 THEN is_ttr ELSE 0 END) AS ttr_2
   FROM enc_rank
   GROUP BY id_siniestro
+),
+
+-- 4) Siniestros (del rango) con algún contacto registrado en cualquier encargo.
+--    Se calcula una vez y se descarta con anti-join, en lugar de un
+--    NOT EXISTS correlacionado por cada fila.
+siniestros_con_contacto AS (
+  SELECT DISTINCT e.id_siniestro
+  FROM softline_encargos e
+  JOIN siniestros_en_rango sr ON sr.id_siniestro = e.id_siniestro
+  JOIN softline_encargos_contactos ec
+    ON ec.contactos_id_encargo = e.id_encargo
+  WHERE ec.contactos_fechahora IS NOT NULL
 )
 
 SELECT
@@ -110,19 +139,13 @@ LEFT JOIN softline_implicados i
   ON i.id_siniestro = s.id_siniestro
  AND i.tipo_implicado = 1
 JOIN enc_info ei ON ei.id_siniestro = s.id_siniestro
+LEFT JOIN siniestros_con_contacto scc ON scc.id_siniestro = s.id_siniestro
 WHERE s.id_despacho = 2
   AND s.id_cia IN (42,399)
   AND CHAR_LENGTH(c.codigo) >= 9
 
   -- sin contacto
-  AND NOT EXISTS (
-    SELECT 1
-    FROM softline_encargos e
-    JOIN softline_encargos_contactos ec
-      ON ec.contactos_id_encargo = e.id_encargo
-    WHERE e.id_siniestro = s.id_siniestro
-      AND ec.contactos_fechahora IS NOT NULL
-  )
+  AND scc.id_siniestro IS NULL
 
   -- regla diagrama (sobre histórico)
   AND (
@@ -166,16 +189,20 @@ def day_bounds(target: date) -> tuple[datetime, datetime]:
     return start, end
 
 
-def run_query(cfg: DbConfig, target_day: date) -> list[tuple[str, Optional[date], str, str, str, str, str, str]]:
-    """Ejecuta la consulta SQL en la BD de PeritoLine usando mysql-connector-python con SSL.
-    
+@contextmanager
+def _export_rows(cfg: DbConfig, target_day: date) -> Iterator[Iterator[tuple[str, Optional[date], str, str, str, str, str, str]]]:
+    """Ejecuta SQL_EXPORT y produce un iterador de filas ya convertidas.
+
+    Las filas salen del cursor (sin buffer) según se consumen: no se
+    materializan con fetchall. La conexión sigue abierta hasta salir del with.
+
     Args:
         cfg: Configuración de la base de datos.
         target_day: Día objetivo para filtrar encargos.
-    
+
     Returns:
-        Lista de tuplas (encargo, fecha_siniestro, causa, aseguradora, asegurado, direccion, codigo_postal, municipio).
-    
+        Context manager que produce tuplas (encargo, fecha_siniestro, causa, aseguradora, asegurado, direccion, codigo_postal, municipio).
+
     Raises:
         RuntimeError: Si hay error de conexión o ejecución.
     """
@@ -197,6 +224,10 @@ def run_query(cfg: DbConfig, target_day: date) -> list[tuple[str, Optional[date]
             "autocommit": True,
             "use_pure": True,
             "charset": "latin1",
+            # Las filas se leen del cursor mientras se escribe el Excel: si la
+            # escritura falla a medias, el cierre descarta las pendientes en
+            # lugar de fallar con "Unread result found".
+            "consume_results": True,
         }
         
         if ssl_ca and ssl_cert and ssl_key:
@@ -210,13 +241,18 @@ def run_query(cfg: DbConfig, target_day: date) -> list[tuple[str, Optional[date]
             conn_params["ssl_verify_identity"] = False
         
         cnx = mysql.connector.connect(**conn_params)
-        cur = cnx.cursor()
-        cur.execute(SQL_EXPORT, {"day_start": day_start, "day_end": day_end})
-        rows = cur.fetchall()
-        cur.close()
-        cnx.close()
-        print(f"✓ Consulta exitosa: {len(rows)} filas")
-        return [(str(r[0]) if r[0] is not None else "", r[1], str(r[2] or ""), str(r[3] or ""), str(r[4] or ""), str(r[5] or ""), str(r[6] or ""), str(r[7] or "")) for r in rows]
+        try:
+            cur = cnx.cursor()
+            try:
+                cur.execute(SQL_EXPORT, {"day_start": day_start, "day_end": day_end})
+                yield (
+                    (str(r[0]) if r[0] is not None else "", r[1], str(r[2] or ""), str(r[3] or ""), str(r[4] or ""), str(r[5] or ""), str(r[6] or ""), str(r[7] or ""))
+                    for r in cur
+                )
+            finally:
+                cur.close()
+        finally:
+            cnx.close()
         
     except mysql.connector.errors.ProgrammingError as e:
         raise RuntimeError(f"Error de credenciales o permisos BD ({cfg.host}): {e}")
@@ -224,46 +260,78 @@ def run_query(cfg: DbConfig, target_day: date) -> list[tuple[str, Optional[date]
         raise RuntimeError(f"Error conectando con BD: {e}")
 
 
-def write_excel(rows: list[tuple[str, Optional[date], str, str, str, str, str, str]], out_path: str) -> None:
-    """Escribe el Excel con 8 columnas: Encargo, Fecha Sin., Causa, Aseguradora, Asegurado, Dirección, CP, Municipio"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Allianz"
+def export_excel(cfg: DbConfig, target_day: date, out_path: str, guardar_vacio: bool = True) -> int:
+    """Ejecuta la consulta y escribe el Excel en una sola pasada.
+
+    Cada fila del cursor se vuelca directamente a la hoja write-only, sin
+    lista intermedia (ver write_excel).
+
+    Args:
+        cfg: Configuración de la base de datos.
+        target_day: Día objetivo para filtrar encargos.
+        out_path: Ruta del Excel de salida.
+        guardar_vacio: Si es False y la consulta no devuelve filas, no se
+            escribe el fichero.
+
+    Returns:
+        Número de filas exportadas.
+
+    Raises:
+        RuntimeError: Si hay error de conexión o ejecución.
+    """
+    with _export_rows(cfg, target_day) as filas:
+        n = write_excel(filas, out_path, guardar_vacio=guardar_vacio)
+    print(f"✓ Consulta exitosa: {n} filas")
+    return n
+
+
+def write_excel(rows: Iterable[tuple[str, Optional[date], str, str, str, str, str, str]], out_path: str, guardar_vacio: bool = True) -> int:
+    """Escribe el Excel con 8 columnas: Encargo, Fecha Sin., Causa, Aseguradora, Asegurado, Dirección, CP, Municipio
+
+    Usa el modo write-only de openpyxl: las filas se vuelcan al XML según se
+    añaden, sin mantener un objeto Cell por celda en memoria. rows puede ser
+    cualquier iterable, también las filas del cursor (ver export_excel).
+    Devuelve el número de filas escritas; con guardar_vacio=False y ninguna
+    fila no se escribe el fichero.
+    """
+    # Se mira la primera fila antes de crear el libro: un libro write-only que
+    # no se guarda deja su fichero temporal sin borrar.
+    filas = iter(rows)
+    primera = next(filas, None)
+    if primera is None and not guardar_vacio:
+        return 0
+    if primera is not None:
+        filas = chain((primera,), filas)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Allianz")
+
+    # Anchos: en write-only deben fijarse antes de escribir filas
+    for col, width in EXPORT_WIDTHS.items():
+        ws.column_dimensions[col].width = width
 
     # Headers
-    headers = ["Encargo", "Fecha Sin.", "Causa", "Aseguradora", "Asegurado", "Dirección", "CP", "Municipio"]
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = Font(bold=True)
+    bold = Font(bold=True)
+    header_cells = []
+    for header in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = bold
+        header_cells.append(cell)
+    ws.append(header_cells)
 
     # Data
-    for i, (encargo, fecha, causa, aseguradora, asegurado, direccion, codigo_postal, municipio) in enumerate(rows, start=2):
-        ws.cell(row=i, column=1, value=encargo)
-        
-        c_fecha = ws.cell(row=i, column=2, value=fecha)
+    n = 0
+    for encargo, fecha, causa, aseguradora, asegurado, direccion, codigo_postal, municipio in filas:
+        c_fecha = WriteOnlyCell(ws, value=fecha)
         if fecha is not None:
             c_fecha.number_format = "DD/MM/YYYY"
-        
-        ws.cell(row=i, column=3, value=causa)
-        ws.cell(row=i, column=4, value=aseguradora)
-        ws.cell(row=i, column=5, value=asegurado)
-        ws.cell(row=i, column=6, value=direccion)
-        ws.cell(row=i, column=7, value=codigo_postal)
-        ws.cell(row=i, column=8, value=municipio)
-
-    # Ajustar anchos
-    ws.column_dimensions["A"].width = 16  # Encargo
-    ws.column_dimensions["B"].width = 14  # Fecha Sin.
-    ws.column_dimensions["C"].width = 30  # Causa
-    ws.column_dimensions["D"].width = 16  # Aseguradora
-    ws.column_dimensions["E"].width = 30  # Asegurado
-    ws.column_dimensions["F"].width = 40  # Dirección
-    ws.column_dimensions["G"].width = 10  # CP
-    ws.column_dimensions["H"].width = 25  # Municipio
+        ws.append([encargo, c_fecha, causa, aseguradora, asegurado, direccion, codigo_postal, municipio])
+        n += 1
 
     out = Path(out_path)
     out.parent.mkdir(parents=True, exist_ok=True)
     wb.save(out)
+    return n
 
 
 def parse_args() -> argparse.Namespace:
@@ -311,17 +379,16 @@ def main() -> None:
     print(f"   Fecha objetivo: {target_day}")
     
     cfg = get_db_config()
-    rows = run_query(cfg, target_day)
+    # Sin filas no se escribe el Excel (se conserva el anterior, si lo hay)
+    n_rows = export_excel(cfg, target_day, str(latest_path), guardar_vacio=False)
     
-    if not rows:
+    if not n_rows:
         print(f"⚠️  No se encontraron siniestros para la fecha {target_day}")
         print(f"   Verifica que haya datos en la BD para esa fecha")
         return
     
-    write_excel(rows, str(latest_path))
-    
     print(f"✅ Excel generado: {latest_path}")
-    print(f"   → {len(rows)} siniestros exportados")
+    print(f"   → {n_rows} siniestros exportados")
     print(f"   → 8 columnas: Encargo, Fecha Sin., Causa, Aseguradora, Asegurado, Dirección, CP, Municipio")
     
     # PASO 2: Extraer teléfonos de ePAC (si no se especifica --skip-epac)
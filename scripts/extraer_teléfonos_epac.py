@@ -5,6 +5,7 @@ Modos:
 - --refresh: borra excels existentes (raw_allianz) y genera uno nuevo desde BD
 - --excel: usa un Excel existente (sin descargar)
 - --headless: ejecuta con navegador oculto (sin UI). Si no, con navegador visible.
+- --workers N: reparte los siniestros entre N sesiones ePAC en paralelo.
 
 Flujo:
 1) Generar/obtener Excel desde BD (export_allianz_from_db) o usar uno existente
@@ -24,9 +25,12 @@ Flujo:
 from __future__ import annotations
 
 import argparse
+import json
 import os
 import re
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, TYPE_CHECKING
@@ -38,7 +42,7 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from config import AppConfig, load_config
-from export_allianz_from_db import get_db_config as _get_db_config, run_query as _run_query, write_excel as _write_excel
+from export_allianz_from_db import get_db_config as _get_db_config, export_excel as _export_excel
 
 
 from epac.pages.epac_ficha_peritacion_page import EpacFichaPeritacionPage
@@ -46,6 +50,7 @@ from epac.pages.login_page import LoginPage
 from epac.pages.menu_lateral_page import MenuLateralPage
 from epac.pages.navigation_page import NavigationPage
 from epac.pages.num_siniestro_page import NumeroSiniestroPage
+from utils.human import backoff_delay
 from utils.logging_utils import get_logger, setup_logging
 
 # Importar mysql.connector para obtener credenciales de BD (sin Playwright)
@@ -64,6 +69,9 @@ from openpyxl.styles import Font
 
 RAW_DIR = Path("data/peritoline/raw_allianz")
 
+# Todo lo que no es dígito (normalizar_siniestro se llama una vez por encargo)
+NON_DIGIT_RE = re.compile(r"\D")
+
 
 # -----------------------------------------------------------------------------
 # Utilidades Excel
@@ -80,18 +88,16 @@ def borrar_excels_raw_allianz() -> int:
     """
     RAW_DIR.mkdir(parents=True, exist_ok=True)
     n = 0
-    for p in RAW_DIR.glob("*.xlsx"):
-        try:
-            p.unlink()
-            n += 1
-        except Exception:
-            pass
-    for p in RAW_DIR.glob("*.xls"):
-        try:
-            p.unlink()
-            n += 1
-        except Exception:
-            pass
+    # Una sola pasada por el directorio para .xlsx y .xls
+    with os.scandir(RAW_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith((".xlsx", ".xls")):
+                continue
+            try:
+                os.unlink(entry.path)
+                n += 1
+            except Exception:
+                pass
     return n
 
 
@@ -107,10 +113,20 @@ def pick_latest_excel(raw_dir: Path) -> Optional[Path]:
     Notes:
         Documentación pensada para MkDocs.
     """
-    files = [p for p in raw_dir.glob("*.xlsx") if p.is_file()]
-    if not files:
+    # os.scandir: is_file() sale del propio listado (sin stat extra por fichero)
+    latest: Optional[Path] = None
+    latest_mtime = float("-inf")
+    try:
+        it = os.scandir(raw_dir)
+    except FileNotFoundError:
         return None
-    return max(files, key=lambda p: p.stat().st_mtime)
+    with it:
+        for entry in it:
+            if entry.name.endswith(".xlsx") and entry.is_file():
+                mtime = entry.stat().st_mtime
+                if mtime > latest_mtime:
+                    latest, latest_mtime = Path(entry.path), mtime
+    return latest
 
 
 def normalizar_siniestro(s: str) -> str:
@@ -125,7 +141,13 @@ def normalizar_siniestro(s: str) -> str:
     Notes:
         Documentación pensada para MkDocs.
     """
-    return re.sub(r"\D", "", (s or "").strip())
+    s = s or ""
+    # Caso habitual: el encargo ya viene solo con dígitos ASCII y se devuelve
+    # tal cual, sin pasar por la regex (isascii/isdigit son chequeos en C).
+    if s.isascii() and s.isdigit():
+        return s
+    # Sin strip previo: los espacios ya son \D y se eliminan igual.
+    return NON_DIGIT_RE.sub("", s)
 
 
 def filtrar_siniestros_validos(lista: list[str], min_len: int = 9) -> list[str]:
@@ -141,16 +163,9 @@ def filtrar_siniestros_validos(lista: list[str], min_len: int = 9) -> list[str]:
     Notes:
         Documentación pensada para MkDocs.
     """
-    out = []
-    seen = set()
-    for s in lista:
-        x = normalizar_siniestro(s)
-        if len(x) < min_len:
-            continue
-        if x not in seen:
-            seen.add(x)
-            out.append(x)
-    return out
+    # dict.fromkeys deduplica conservando el orden de primera aparición.
+    normalizados = (normalizar_siniestro(s) for s in lista)
+    return list(dict.fromkeys(x for x in normalizados if len(x) >= min_len))
 
 
 def obtener_credenciales_epac(config: AppConfig) -> dict:
@@ -179,7 +194,6 @@ def obtener_credenciales_epac(config: AppConfig) -> dict:
         db_name = getattr(config, "db_name", None) or os.getenv("DB_NAME") or "criteria_peritoline"
 
         if db_host and db_user and db_password and db_name:
-            cnx = None
             try:
                 # Configurar parámetros SSL si existen
                 conn_params = {
@@ -210,18 +224,25 @@ def obtener_credenciales_epac(config: AppConfig) -> dict:
                     conn_params["ssl_cert"] = ssl_config.get("cert")
                     conn_params["ssl_key"] = ssl_config.get("key")
                 
-                cnx = mysql.connector.connect(**conn_params)  # type: ignore[name-defined]
                 query = (
                     "SELECT url, user AS usuario, pass AS password "
                     "FROM softline_aseguradoras_claves_web "
                     "WHERE id_cia IN (42, 399) "
                     "LIMIT 1"
                 )
-                cur = cnx.cursor(dictionary=True)
-                cur.execute(query)
-                row = cur.fetchone()
-                cur.close()
-                cnx.close()
+                # Una única consulta por proceso: una conexión directa basta (un
+                # pool abriría pool_size conexiones para usar una). Se cierra
+                # siempre, también si la consulta falla.
+                cnx = mysql.connector.connect(**conn_params)  # type: ignore[name-defined]
+                try:
+                    cur = cnx.cursor(dictionary=True)
+                    try:
+                        cur.execute(query)
+                        row = cur.fetchone()
+                    finally:
+                        cur.close()
+                finally:
+                    cnx.close()
 
                 if row:
                     logger.info("Credenciales obtenidas desde BD")
@@ -254,8 +275,46 @@ def obtener_credenciales_epac(config: AppConfig) -> dict:
 
 EPAC_PRIVATE_APP_URL = "https://www.e-pacallianz.com/ngx-epac-professional/private/"
 
+# Fallos de sesión seguidos (no de datos) tras los que se abre el circuito
+MAX_ERRORES_CONSECUTIVOS = 5
+# Pausa antes de intentar recuperar la sesión con el circuito abierto
+PAUSA_RECUPERACION_MS = 30_000
+# Recuperaciones (recarga + login) permitidas por sesión antes de abandonar
+MAX_RECUPERACIONES_SESION = 2
+
+
+class SesionEpacError(RuntimeError):
+    """Fallo de la sesión ePAC (no del siniestro): la búsqueda no es alcanzable."""
+
+
+def es_fallo_de_sesion(page: Page, error: Exception) -> bool:
+    """Distingue un fallo de la sesión ePAC de un fallo propio del siniestro.
 
-def login_epac(page: Page, url: str, usuario: str, password: str) -> None:
+    Args:
+        page: Pagina activa de Playwright.
+        error: Excepción con la que terminó el siniestro.
+
+    Returns:
+        True si la página está cerrada o la pantalla de búsqueda no es
+        alcanzable; False para fallos de datos (p. ej. código sin resultados).
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    if isinstance(error, SesionEpacError):
+        return True
+    # TargetClosedError no se exporta en playwright.sync_api: se reconoce por
+    # nombre o por el estado de la página.
+    return type(error).__name__ == "TargetClosedError" or page.is_closed()
+
+
+def login_epac(
+    page: Page,
+    url: str,
+    usuario: str,
+    password: str,
+    timeout_ms: int = 30_000,
+) -> None:
     """Inicia sesion en ePAC usando el formulario de login.
 
     Args:
@@ -263,6 +322,7 @@ def login_epac(page: Page, url: str, usuario: str, password: str) -> None:
         url: URL base de ePAC.
         usuario: Usuario de acceso.
         password: Clave de acceso.
+        timeout_ms: Espera máxima hasta que aparezca el menú tras el login.
 
     Returns:
         None.
@@ -275,15 +335,180 @@ def login_epac(page: Page, url: str, usuario: str, password: str) -> None:
     login_page = LoginPage(page)
     login_page.open(url)
     login_page.login(usuario, password)
-    page.wait_for_timeout(1000)
+    # Esperar al elemento de destino en lugar de una pausa fija.
+    page.get_by_role("menuitem", name="Aplic. Allianz", exact=True).wait_for(
+        state="visible", timeout=timeout_ms
+    )
+
+
+def reanudar_sesion_epac(page: Page, timeout_ms: int = 30_000) -> bool:
+    """Comprueba si la página ya arranca con una sesión ePAC válida.
+
+    Pensado para contextos creados con el storage_state de otro login: abre
+    la zona privada y espera a lo primero que aparezca, el menú principal
+    (sesión viva) o el formulario de login (sesión caducada), para no agotar
+    el timeout cuando la sesión ya no vale.
+
+    Args:
+        page: Pagina activa de Playwright.
+        timeout_ms: Espera máxima hasta que aparezca el menú o el login.
+
+    Returns:
+        True si la sesión sigue viva; False si hay que hacer login.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    page.goto(EPAC_PRIVATE_APP_URL, wait_until="commit")
+    menu = page.get_by_role("menuitem", name="Aplic. Allianz", exact=True)
+    formulario_login = page.locator(LoginPage.username_input_selector)
+    try:
+        menu.or_(formulario_login).first.wait_for(state="visible", timeout=timeout_ms)
+    except PlaywrightTimeoutError:
+        return False
+    return menu.is_visible()
+
+
+def guardar_sesion_epac(page: Page, config: AppConfig) -> None:
+    """Persiste el storage_state de la página en config.epac_storage_state.
+
+    Se escribe en un temporal del mismo directorio y se sustituye con
+    os.replace: varias sesiones en paralelo pueden guardar a la vez y el
+    fichero nunca queda a medio escribir.
+
+    Args:
+        page: Pagina activa de Playwright con sesión iniciada.
+        config: Configuración de la aplicación.
+
+    Returns:
+        None.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    if not config.epac_storage_state:
+        return
+    path = Path(config.epac_storage_state)
+    tmp_path: Optional[str] = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        os.close(fd)
+        page.context.storage_state(path=tmp_path)
+        os.replace(tmp_path, path)
+        tmp_path = None
+    except Exception as e:
+        get_logger(tarea="sesion_epac").warning(f"No se pudo guardar la sesión ePAC: {e}")
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def cargar_sesion_guardada(config: AppConfig) -> Optional[dict]:
+    """Lee el storage_state ePAC persistido en config.epac_storage_state.
+
+    Args:
+        config: Configuración de la aplicación.
+
+    Returns:
+        storage_state guardado, o None si no está configurado, no existe o
+        no se puede leer.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    if not config.epac_storage_state:
+        return None
+    path = Path(config.epac_storage_state)
+    if not path.is_file():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        get_logger(tarea="sesion_epac").warning(f"Sesión guardada ilegible ({path}): {e}")
+        return None
+
+
+def iniciar_sesion_epac(
+    page: Page,
+    config: AppConfig,
+    cred: dict,
+    url_epac: str,
+    storage_state: Optional[dict] = None,
+) -> None:
+    """Deja la página con sesión ePAC: reutiliza storage_state o hace login.
+
+    Tras un login completo, guarda el nuevo storage_state en
+    config.epac_storage_state (si está configurado) para las siguientes
+    ejecuciones.
+
+    Args:
+        page: Pagina activa de Playwright (creada con storage_state, si lo hay).
+        config: Configuración de la aplicación.
+        cred: Credenciales ePAC (username y password).
+        url_epac: URL de login de ePAC.
+        storage_state: Sesión con la que se creó el contexto de la página.
+
+    Returns:
+        None.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    if storage_state and reanudar_sesion_epac(page, timeout_ms=config.navigation_timeout_ms):
+        return
+
+    login_epac(
+        page,
+        url_epac,
+        cred["username"],
+        cred["password"],
+        timeout_ms=config.navigation_timeout_ms,
+    )
+    guardar_sesion_epac(page, config)
+
+
+def capturar_sesion_epac(config: AppConfig, cred: dict, url_epac: str) -> dict:
+    """Prepara una sesión ePAC y devuelve su storage_state para reutilizarlo.
+
+    Parte de la sesión persistida (config.epac_storage_state) si sigue viva;
+    si no, hace login.
+
+    Args:
+        config: Configuración de la aplicación.
+        cred: Credenciales ePAC (username y password).
+        url_epac: URL de login de ePAC.
 
+    Returns:
+        storage_state del contexto (cookies y localStorage).
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    from browser import launch_browser  # Lazy import: solo al entrar en ePAC
+
+    guardada = cargar_sesion_guardada(config)
+    with launch_browser(config, guardada) as (_, page):
+        iniciar_sesion_epac(page, config, cred, url_epac, guardada)
+        return page.context.storage_state()
 
-def navegar_a_peritaciones_diversos(page: Page, config: AppConfig) -> None:
+
+def navegar_a_peritaciones_diversos(
+    page: Page,
+    config: AppConfig,
+    navigation: Optional[NavigationPage] = None,
+) -> None:
     """Navega al formulario de Peritaciones Diversos.
 
     Args:
         page: Pagina activa de Playwright.
         config: Configuración de la aplicación.
+        navigation: Page object ya construido para reutilizar sus locators.
 
     Returns:
         None.
@@ -293,7 +518,7 @@ def navegar_a_peritaciones_diversos(page: Page, config: AppConfig) -> None:
     """
     logger = get_logger(tarea="navegar_peritaciones_diversos")
     logger.info("Navegando a Peritaciones Diversos")
-    navigation = NavigationPage(page, config)
+    navigation = navigation or NavigationPage(page, config)
     navigation.goto_informe_pericial_diversos_sea()
     siniestro_page = NumeroSiniestroPage(page)
     siniestro_page.wait_until_ready()
@@ -303,6 +528,7 @@ def asegurar_pantalla_busqueda(
     page: Page,
     config: AppConfig,
     reintentos: int = 3,
+    siniestro_page: Optional[NumeroSiniestroPage] = None,
 ) -> None:
     """Asegura que #claimNumber esté visible. Si no, navega.
 
@@ -310,23 +536,52 @@ def asegurar_pantalla_busqueda(
         page: Pagina activa de Playwright.
         config: Configuración de la aplicación.
         reintentos: Numero de reintentos.
+        siniestro_page: Page object ya construido para reutilizar sus locators.
 
     Returns:
         None.
 
+    Raises:
+        SesionEpacError: Si la pantalla de búsqueda no es alcanzable.
+
     Notes:
         Documentación pensada para MkDocs.
     """
+    siniestro_page = siniestro_page or NumeroSiniestroPage(page)
     for intento in range(1, reintentos + 1):
         try:
-            siniestro_page = NumeroSiniestroPage(page)
             siniestro_page.wait_until_ready()
             return
-        except Exception:
-            if intento < reintentos:
+        except Exception as e:
+            if intento == reintentos:
+                raise SesionEpacError("No pude asegurar pantalla de búsqueda") from e
+            try:
                 navegar_a_peritaciones_diversos(page, config)
-            else:
-                raise RuntimeError("No pude asegurar pantalla de búsqueda")
+            except Exception as nav_error:
+                raise SesionEpacError(
+                    f"No pude navegar a Peritaciones Diversos: {nav_error}"
+                ) from nav_error
+
+
+def buscar_y_seleccionar_siniestro(
+    siniestro_page: NumeroSiniestroPage,
+    siniestro: str,
+) -> None:
+    """Busca el siniestro y abre su fila de resultados.
+
+    Args:
+        siniestro_page: Page object de la pantalla de búsqueda, ya lista.
+        siniestro: Codigo del siniestro.
+
+    Returns:
+        None.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    siniestro_page.fill_siniestro_number(siniestro)
+    siniestro_page.submit_codigo()
+    siniestro_page.seleccionar_resultado_por_codigo(siniestro)
 
 
 def abrir_ficha_peritacion_menu_lateral(
@@ -334,6 +589,8 @@ def abrir_ficha_peritacion_menu_lateral(
     siniestro: str,
     config: AppConfig,
     reintentos: int = 3,
+    menu_page: Optional[MenuLateralPage] = None,
+    siniestro_page: Optional[NumeroSiniestroPage] = None,
 ) -> None:
     """Abre la ficha de peritacion desde el menu lateral.
 
@@ -342,26 +599,49 @@ def abrir_ficha_peritacion_menu_lateral(
         siniestro: Codigo del siniestro.
         config: Configuración de la aplicación.
         reintentos: Numero de reintentos.
+        menu_page: Page object ya construido para reutilizar sus locators.
+        siniestro_page: Page object de búsqueda para repetir la búsqueda.
 
     Returns:
         None.
 
+    Raises:
+        RuntimeError: Si no se puede repetir la búsqueda entre intentos. Es
+            un fallo de este siniestro: la sesión la comprueba el siguiente.
+
     Notes:
         Documentación pensada para MkDocs.
     """
     logger = get_logger(siniestro=siniestro, tarea="abrir_ficha_menu")
+    if menu_page is None:
+        menu_page = MenuLateralPage(page, siniestro=siniestro)
+    else:
+        menu_page.siniestro = siniestro  # solo contexto de logging
+    siniestro_page = siniestro_page or NumeroSiniestroPage(page)
     for intento in range(1, reintentos + 1):
         try:
-            menu_page = MenuLateralPage(page, siniestro=siniestro)
-            menu_page.abrir_ficha_peritacion()
+            # Espera completa de 15 s en todos los intentos: el clic en la fila
+            # recarga el iframe y el menú tarda con normalidad entre 3 y 15 s.
+            menu_page.abrir_ficha_peritacion(timeout_ms=15_000)
             return
         except Exception as e:
             logger.warning(f"Intento {intento}/{reintentos} fallo: {e}")
-            if intento < reintentos:
-                asegurar_pantalla_busqueda(page, config, reintentos=1)
-                page.wait_for_timeout(1000)
-            else:
+            if intento == reintentos:
                 raise
+            page.wait_for_timeout(backoff_delay(intento) * 1000)
+            # Seguimos en el detalle del siniestro, sin #claimNumber: se vuelve
+            # a la búsqueda y se repite antes de reintentar el menú.
+            try:
+                volver_a_busqueda_desde_ficha(page, config)
+                asegurar_pantalla_busqueda(
+                    page, config, reintentos=1, siniestro_page=siniestro_page
+                )
+                buscar_y_seleccionar_siniestro(siniestro_page, siniestro)
+            except Exception as busqueda_error:
+                # No es SesionEpacError: no debe abrir el circuito de procesar_lote.
+                raise RuntimeError(
+                    f"No pude repetir la búsqueda del siniestro: {busqueda_error}"
+                ) from busqueda_error
 
 
 def volver_a_busqueda_desde_ficha(page: Page, config: AppConfig) -> None:
@@ -378,11 +658,20 @@ def volver_a_busqueda_desde_ficha(page: Page, config: AppConfig) -> None:
         Documentación pensada para MkDocs.
     """
     logger = get_logger(tarea="volver_busqueda")
+    volver_btn = page.locator("button", has_text="Volver a búsqueda").first
+    # Sondeo instantáneo, sin los 5 s de margen de antes: al salir de la ficha
+    # ya extraída el botón debería estar renderizado. Si aún no está en el DOM
+    # se va directamente a la navegación completa por el menú.
+    if volver_btn.count() == 0:
+        logger.info("Sin botón 'Volver a búsqueda'. Navegando manualmente.")
+        navegar_a_peritaciones_diversos(page, config)
+        return
     try:
-        volver_btn = page.locator("button:has-text('Volver a búsqueda')").first
-        volver_btn.wait_for(state="visible", timeout=5000)
+        # El sondeo ya confirmó que está en el DOM: click comprueba
+        # visibilidad y accionabilidad por su cuenta.
         volver_btn.click()
-        page.wait_for_timeout(300)
+        # Sin pausa fija: el siguiente siniestro arranca con
+        # asegurar_pantalla_busqueda, que ya espera a #claimNumber.
         logger.info("Vuelto a búsqueda")
     except Exception as e:
         logger.warning(f"No pude volver con botón: {e}. Navegando manualmente.")
@@ -393,13 +682,21 @@ def volver_a_busqueda_desde_ficha(page: Page, config: AppConfig) -> None:
 # Procesado por siniestro
 # -----------------------------------------------------------------------------
 
-def procesar_siniestro(page: Page, numero_siniestro: str, config: AppConfig) -> dict:
+def procesar_siniestro(
+    page: Page,
+    numero_siniestro: str,
+    config: AppConfig,
+    siniestro_page: Optional[NumeroSiniestroPage] = None,
+    menu_page: Optional[MenuLateralPage] = None,
+) -> dict:
     """Procesa un siniestro y devuelve el resultado de telefono.
 
     Args:
         page: Pagina activa de Playwright.
         numero_siniestro: Codigo del siniestro a procesar.
         config: Configuración de la aplicación.
+        siniestro_page: Page object de búsqueda reutilizable entre siniestros.
+        menu_page: Page object del menú lateral reutilizable entre siniestros.
 
     Returns:
         Diccionario con siniestro, telefono y estado.
@@ -411,28 +708,25 @@ def procesar_siniestro(page: Page, numero_siniestro: str, config: AppConfig) ->
     logger.info("Procesando siniestro")
 
     try:
-        # 0) asegurar pantalla búsqueda
-        asegurar_pantalla_busqueda(page, config, reintentos=3)
-
-        # 1) Buscar siniestro
-        siniestro_page = NumeroSiniestroPage(page)
-        siniestro_page.wait_until_ready()
-        siniestro_page.fill_siniestro_number(numero_siniestro)
-        siniestro_page.submit_codigo()
-
-        # 2) Seleccionar resultado
-        siniestro_page.seleccionar_resultado_por_codigo(numero_siniestro)
-
-        # 3) Ir a ficha peritación por menú lateral
-        frame = page.frame_locator("iframe[name='appArea']")
-        frame.locator("body").wait_for(state="attached", timeout=15000)
-        abrir_ficha_peritacion_menu_lateral(page, numero_siniestro, config, reintentos=3)
-
-        # Espera a que la ficha termine de renderizar dentro del iframe
-        frame.locator("body").wait_for(state="attached", timeout=15000)
-
-        # 4) Extraer teléfono SIN cambiar de pantalla
-        ficha = EpacFichaPeritacionPage(page)
+        # 0) asegurar pantalla búsqueda (ya deja el formulario listo)
+        siniestro_page = siniestro_page or NumeroSiniestroPage(page)
+        asegurar_pantalla_busqueda(page, config, reintentos=3, siniestro_page=siniestro_page)
+
+        # 1) Buscar siniestro y 2) seleccionar resultado
+        buscar_y_seleccionar_siniestro(siniestro_page, numero_siniestro)
+
+        # 3) Ir a ficha peritación por menú lateral (espera sus propios nodos)
+        abrir_ficha_peritacion_menu_lateral(
+            page,
+            numero_siniestro,
+            config,
+            reintentos=3,
+            menu_page=menu_page,
+            siniestro_page=siniestro_page,
+        )
+
+        # 4) Extraer teléfono SIN cambiar de pantalla (espera el body del iframe)
+        ficha = EpacFichaPeritacionPage(page, debug=config.debug_phone)
         telefono = ficha.extraer_telefono()
         logger.info(f"Teléfono: {telefono or 'NO ENCONTRADO'}")
 
@@ -449,7 +743,219 @@ def procesar_siniestro(page: Page, numero_siniestro: str, config: AppConfig) ->
             "telefono": None,
             "estado": "ERROR",
             "error": str(e),
+            # Solo los fallos de sesión cuentan para el circuito de procesar_lote
+            "fallo_sesion": es_fallo_de_sesion(page, e),
+        }
+
+
+def recuperar_sesion_epac(
+    page: Page,
+    config: AppConfig,
+    cred: dict,
+    url_epac: str,
+    navigation: NavigationPage,
+) -> bool:
+    """Intenta devolver una sesión ePAC caída a la pantalla de búsqueda.
+
+    Recarga la zona privada; si la sesión ha caducado vuelve a hacer login, y
+    después navega a Peritaciones Diversos.
+
+    Args:
+        page: Pagina activa de Playwright.
+        config: Configuración de la aplicación.
+        cred: Credenciales ePAC (username y password).
+        url_epac: URL de login de ePAC.
+        navigation: Page object de navegación de la sesión.
+
+    Returns:
+        True si la búsqueda vuelve a estar disponible; False si no.
+
+    Notes:
+        Documentación pensada para MkDocs.
+    """
+    logger = get_logger(tarea="recuperar_sesion")
+    if page.is_closed():
+        logger.error("Página cerrada: la sesión no se puede recuperar")
+        return False
+    try:
+        # Si las cookies siguen valiendo basta con recargar; si no, login.
+        if not reanudar_sesion_epac(page, timeout_ms=config.navigation_timeout_ms):
+            login_epac(
+                page,
+                url_epac,
+                cred["username"],
+                cred["password"],
+                timeout_ms=config.navigation_timeout_ms,
+            )
+        navegar_a_peritaciones_diversos(page, config, navigation)
+    except Exception as e:
+        logger.error(f"Recuperación de la sesión ePAC fallida: {e}")
+        return False
+    logger.info("Sesión ePAC recuperada")
+    return True
+
+
+def procesar_lote(
+    config: AppConfig,
+    cred: dict,
+    url_epac: str,
+    siniestros: list[str],
+    etiqueta: str = "",
+    storage_state: Optional[dict] = None,
+) -> list[dict]:
+    """Procesa una lista de siniestros en una sesión ePAC propia.
+
+    Lanza su propio navegador, hace login (o reutiliza storage_state, o la
+    sesión persistida, si sigue viva) y recorre los siniestros en serie.
+
+    Args:
+        config: Configuración de la aplicación.
+        cred: Credenciales ePAC (username y password).
+        url_epac: URL de login de ePAC.
+        siniestros: Siniestros a procesar en esta sesión.
+        etiqueta: Prefijo opcional para las trazas de progreso.
+        storage_state: Sesión ya autenticada (ver capturar_sesion_epac).
+
+    Returns:
+        Lista de resultados por siniestro.
+
+    Notes:
+        Documentación pensada para MkDocs.
+        Tras MAX_ERRORES_CONSECUTIVOS fallos de sesión seguidos (no cuentan
+        los de datos) se pausa, se recupera la sesión y se sigue; si no se
+        recupera, los pendientes se marcan como ERROR sin intentarlos.
+    """
+    if not siniestros:
+        return []  # Sin trabajo no merece la pena arrancar Chromium ni hacer login
+
+    from browser import launch_browser  # Lazy import: solo al entrar en ePAC
+
+    resultados: list[dict] = []
+    storage_state = storage_state or cargar_sesion_guardada(config)
+    with launch_browser(config, storage_state) as (_, page):
+        iniciar_sesion_epac(page, config, cred, url_epac, storage_state)
+        # Page objects de la sesión: se construyen una vez y se reutilizan en
+        # todos los siniestros (y en las recuperaciones).
+        navigation = NavigationPage(page, config)
+        siniestro_page = NumeroSiniestroPage(page)
+        menu_page = MenuLateralPage(page)
+        navegar_a_peritaciones_diversos(page, config, navigation)
+
+        total = len(siniestros)
+        errores_seguidos = 0
+        recuperaciones = 0
+        lote_logger = get_logger(tarea="procesar_lote")
+        for i, s in enumerate(siniestros, start=1):
+            # Circuito abierto: con ePAC caído cada siniestro agotaría todos
+            # sus timeouts. Tras una pausa se intenta recuperar la sesión; si
+            # no se puede, se marcan los pendientes y se devuelve el control.
+            if errores_seguidos >= MAX_ERRORES_CONSECUTIVOS:
+                recuperada = False
+                if recuperaciones < MAX_RECUPERACIONES_SESION and not page.is_closed():
+                    recuperaciones += 1
+                    lote_logger.warning(
+                        f"{etiqueta}{errores_seguidos} fallos de sesión seguidos; "
+                        f"intento de recuperación en {PAUSA_RECUPERACION_MS // 1000} s"
+                    )
+                    page.wait_for_timeout(PAUSA_RECUPERACION_MS)
+                    recuperada = recuperar_sesion_epac(page, config, cred, url_epac, navigation)
+                if not recuperada:
+                    motivo = f"Sesión abortada tras {errores_seguidos} fallos de sesión consecutivos"
+                    lote_logger.error(f"{etiqueta}{motivo}; {total - i + 1} siniestros sin procesar")
+                    resultados.extend(
+                        {"siniestro": pendiente, "telefono": None, "estado": "ERROR", "error": motivo}
+                        for pendiente in siniestros[i - 1:]
+                    )
+                    break
+                # Semiabierto: un solo fallo de sesión más vuelve a abrir el circuito.
+                errores_seguidos = MAX_ERRORES_CONSECUTIVOS - 1
+
+            print(f"{etiqueta}[{i}/{total}] {s}")
+            resultado = procesar_siniestro(page, s, config, siniestro_page, menu_page)
+            resultados.append(resultado)
+            # Un fallo de datos (código sin resultados...) demuestra que la
+            # sesión responde: solo los fallos de sesión suman.
+            errores_seguidos = errores_seguidos + 1 if resultado.get("fallo_sesion") else 0
+
+            # volver siempre a Peritaciones Diversos de forma robusta
+            try:
+                volver_a_busqueda_desde_ficha(page, config)
+            except Exception as e:
+                lote_logger.warning(f"{etiqueta}{s}: no pude volver a búsqueda: {e}. Recargando ePAC.")
+                try:
+                    # navegar_a_peritaciones_diversos ya espera al menú.
+                    page.goto(EPAC_PRIVATE_APP_URL, wait_until="commit")
+                    navegar_a_peritaciones_diversos(page, config, navigation)
+                except Exception as e:
+                    # El siguiente siniestro reintenta vía asegurar_pantalla_busqueda.
+                    lote_logger.error(f"{etiqueta}{s}: recarga de ePAC fallida: {e}")
+
+    return resultados
+
+
+def procesar_en_paralelo(
+    config: AppConfig,
+    cred: dict,
+    url_epac: str,
+    siniestros: list[str],
+    workers: int,
+) -> list[dict]:
+    """Reparte los siniestros entre varias sesiones ePAC concurrentes.
+
+    La API síncrona de Playwright no se puede compartir entre hilos, así que
+    cada hilo ejecuta procesar_lote con su propio navegador. El login se hace
+    una sola vez y su storage_state se reparte entre las sesiones (si ePAC la
+    rechaza, cada sesión vuelve al login normal). El tiempo de espera de red
+    de cada sesión se solapa con el de las demás.
+
+    Args:
+        config: Configuración de la aplicación.
+        cred: Credenciales ePAC (username y password).
+        url_epac: URL de login de ePAC.
+        siniestros: Siniestros a procesar.
+        workers: Número máximo de sesiones simultáneas.
+
+    Returns:
+        Lista de resultados por siniestro (sin orden garantizado).
+
+    Notes:
+        Documentación pensada para MkDocs.
+        Si una sesión falla por completo (p. ej. en el login), sus siniestros
+        se marcan como ERROR y el resto de sesiones continúa.
+    """
+    logger = get_logger(tarea="procesar_en_paralelo")
+    lotes = [lote for lote in (siniestros[k::workers] for k in range(workers)) if lote]
+    if not lotes:
+        return []
+    if len(lotes) == 1:
+        # Una sola sesión: no hace falta el login compartido ni el pool.
+        return procesar_lote(config, cred, url_epac, lotes[0])
+    logger.info(f"Procesando {len(siniestros)} siniestros en {len(lotes)} sesiones")
+
+    try:
+        storage_state = capturar_sesion_epac(config, cred, url_epac)
+    except Exception as e:
+        logger.warning(f"No se pudo preparar la sesión compartida, login por sesión: {e}")
+        storage_state = None
+
+    resultados: list[dict] = []
+    with ThreadPoolExecutor(max_workers=len(lotes)) as executor:
+        futuros = {
+            executor.submit(
+                procesar_lote, config, cred, url_epac, lote, f"[s{n}]", storage_state
+            ): lote
+            for n, lote in enumerate(lotes, start=1)
         }
+        for futuro in as_completed(futuros):
+            try:
+                resultados.extend(futuro.result())
+            except Exception as e:
+                logger.error(f"Sesión ePAC fallida: {e}")
+                resultados.extend(
+                    {"siniestro": s, "telefono": None, "estado": "ERROR", "error": str(e)}
+                    for s in futuros[futuro]
+                )
+    return resultados
 
 
 def actualizar_excel_con_telefonos(excel_path: Path, resultados: list[dict]) -> None:
@@ -527,8 +1033,7 @@ def exportar_excel_desde_bd() -> Path:
     # export_allianz_from_db lee DB_* desde .env / entorno (ya cargado por load_config)
     cfg = _get_db_config()
     target_day = datetime.now().date()
-    rows = _run_query(cfg, target_day)
-    _write_excel(rows, out)
+    _export_excel(cfg, target_day, str(out))
     return out
 
 
@@ -555,10 +1060,11 @@ def main() -> None:
                         help="Longitud mínima de siniestro numérico para procesar (por defecto 9).")
     parser.add_argument("--max", type=int, default=0,
                         help="Procesa solo los primeros N siniestros (0 = todos).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Sesiones ePAC en paralelo, cada una con su navegador y el login compartido (por defecto 1).")
     args = parser.parse_args()
 
-    config = load_config()
-    config.headless = args.headless
+    config = load_config({"headless": args.headless})
 
     # 1) Excel (preferencia: BD). Si no se indica --excel, generamos/recogemos uno en RAW_DIR.
     excel_in: Optional[Path] = None
@@ -578,21 +1084,29 @@ def main() -> None:
     print(f"Excel (BD) guardado en: {excel_in}")
 
     # 2) Leer siniestros/encargos (columna "Encargo")
-    wb = openpyxl.load_workbook(excel_in)
-    ws = wb.active
-    headers = [str(c.value).strip() if c.value else "" for c in ws[1]]
-    if "Encargo" not in headers:
-        raise SystemExit("No encuentro columna 'Encargo' en el excel.")
-    idx = headers.index("Encargo")
-    siniestros: list[str] = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        siniestros.append(str(row[idx] or "").strip())
+    # Solo lectura: las filas se leen en streaming del XML sin construir el
+    # modelo de celdas completo (el Excel se reescribe después en el paso 6).
+    wb = openpyxl.load_workbook(excel_in, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = [str(v).strip() if v else "" for v in next(rows, ())]
+        if "Encargo" not in headers:
+            raise SystemExit("No encuentro columna 'Encargo' en el excel.")
+        idx = headers.index("Encargo")
+        # Las celdas vacías se descartan aquí; normalizar_siniestro ya hace el strip.
+        siniestros = [
+            str(row[idx]) for row in rows if len(row) > idx and row[idx]
+        ]
+    finally:
+        # En modo solo lectura el fichero queda abierto hasta close().
+        wb.close()
+    leidos = len(siniestros)
 
     siniestros = filtrar_siniestros_validos(siniestros, min_len=args.min_siniestro_len)
     if args.max and args.max > 0:
         siniestros = siniestros[:args.max]
 
-    print(f"  - Siniestros válidos: {len(siniestros)}")
+    print(f"  - Siniestros válidos: {len(siniestros)} (de {leidos} encargos leídos)")
 
     if not siniestros:
         print("No hay siniestros válidos tras filtrar.")
@@ -603,28 +1117,10 @@ def main() -> None:
     url_epac = cred.get("url") or "https://www.e-pacallianz.com/ngx-epac-professional/"
 
     # 5) ePAC extracción
-    resultados: list[dict] = []
-
-    from browser import launch_browser  # Lazy import: solo al entrar en ePAC
-    with launch_browser(config) as (_, page):
-        login_epac(page, url_epac, cred["username"], cred["password"])
-        navegar_a_peritaciones_diversos(page, config)
-
-        total = len(siniestros)
-        for i, s in enumerate(siniestros, start=1):
-            print(f"[{i}/{total}] {s}")
-            resultados.append(procesar_siniestro(page, s, config))
-
-            # volver siempre a Peritaciones Diversos de forma robusta
-            try:
-                volver_a_busqueda_desde_ficha(page, config)
-            except Exception:
-                try:
-                    page.goto(EPAC_PRIVATE_APP_URL, wait_until="domcontentloaded")
-                    page.wait_for_timeout(800)
-                    navegar_a_peritaciones_diversos(page, config)
-                except Exception:
-                    pass
+    if args.workers > 1:
+        resultados = procesar_en_paralelo(config, cred, url_epac, siniestros, args.workers)
+    else:
+        resultados = procesar_lote(config, cred, url_epac, siniestros)
 
     # 6) Actualizar Excel con teléfonos
     actualizar_excel_con_telefonos(excel_in, resultados)
@@ -30,3 +30,18 @@ def human_delay(
     logger = get_logger(siniestro=siniestro, tarea=motivo or "espera_humana")
     logger.info("Pausa humana de %.2fs", pausa)
     time.sleep(pausa)
+
+
+def backoff_delay(intento: int, base_s: float = 0.25, cap_s: float = 4.0) -> float:
+    """Calcula la pausa entre reintentos con backoff exponencial y jitter.
+
+    Args:
+        intento: Número de intento ya fallido (1 para el primero).
+        base_s: Pausa base del primer reintento, en segundos.
+        cap_s: Pausa máxima antes de aplicar el jitter, en segundos.
+
+    Returns:
+        Pausa en segundos, entre el 50 % y el 150 % de min(cap_s, base_s * 2**intento).
+    """
+
+    return min(cap_s, base_s * 2**intento) * (0.5 + random.random())